@@ -0,0 +1,23 @@
+# Production entry point; run from the backend directory: python run.py
+#
+# Kept separate from server.py on purpose: uvicorn spawns each worker by
+# re-running this script and then importing "server:app", so this module must
+# not import server itself or every worker would build a second Mongo client
+# and logging pipeline.
+import os
+
+import uvicorn
+
+if __name__ == "__main__":
+    # One process per core, libuv event loop and the C HTTP parser. Access
+    # logs are off; app logs go through the queue listener in server.py.
+    uvicorn.run(
+        "server:app",
+        host=os.environ.get("HOST", "0.0.0.0"),
+        port=int(os.environ.get("PORT", "8001")),
+        workers=int(os.environ.get("WEB_CONCURRENCY", os.cpu_count() or 1)),
+        loop="uvloop",
+        http="httptools",
+        access_log=False,
+        proxy_headers=True
+    )
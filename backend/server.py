@@ -1,17 +1,28 @@
 from fastapi import FastAPI, APIRouter, HTTPException, Depends, status
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from fastapi.security import HTTPBearer, HTTPAuthorizationCredentials
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
-from passlib.context import CryptContext
+from pymongo.errors import BulkWriteError, DuplicateKeyError, PyMongoError
 from pydantic import BaseModel, Field, EmailStr
 from datetime import datetime, timezone, timedelta
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+from cachetools import LRUCache, TTLCache
 from emergentintegrations.llm.chat import LlmChat, UserMessage
 import os
 import logging
+import queue
 import uuid
+import time
+import orjson
 import jwt
+import bcrypt
+import asyncio
+import copy
+from concurrent.futures import ThreadPoolExecutor
+from logging.handlers import QueueHandler, QueueListener
+from functools import lru_cache
 from pathlib import Path
 
 ROOT_DIR = Path(__file__).parent
@@ -19,18 +30,84 @@ load_dotenv(ROOT_DIR / '.env')
 
 # MongoDB connection
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
+client = AsyncIOMotorClient(
+    mongo_url,
+    maxPoolSize=int(os.environ.get("MONGO_MAX_POOL", "50")),
+    minPoolSize=int(os.environ.get("MONGO_MIN_POOL", "10")),
+    serverSelectionTimeoutMS=3000,
+    compressors=os.environ.get("MONGO_COMPRESSORS", "zstd,zlib")
+)
 db = client[os.environ['DB_NAME']]
 
 # Security
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+BCRYPT_ROUNDS = int(os.environ.get("BCRYPT_ROUNDS", "12"))
+# bcrypt is CPU-bound; run it off the event loop so logins don't serialize.
+# The pool is per worker process, and run.py starts one worker per core, so
+# keep it small: workers x BCRYPT_THREADS threads share the machine's cores.
+BCRYPT_THREADS = int(os.environ.get("BCRYPT_THREADS", "2"))
+_bcrypt_pool = ThreadPoolExecutor(max_workers=BCRYPT_THREADS, thread_name_prefix="bcrypt")
 security = HTTPBearer()
 JWT_SECRET = "thrapy_secret_key_2024"
 JWT_ALGORITHM = "HS256"
 JWT_EXPIRATION_TIME_MINUTES = 60 * 24 * 7  # 7 days
 
+# Verified (user_id, exp) claims keyed by raw bearer token, so repeat tokens
+# only need an expiry check instead of a full decode
+_token_cache = LRUCache(maxsize=50_000)
+
+# Resolved users keyed by raw bearer token, so repeat requests skip the DB lookup.
+# The cache is per process: admin changes clear it only in the worker that
+# handled them, so other workers may serve a deleted user or an old role for
+# up to USER_CACHE_TTL seconds.
+USER_CACHE_TTL = 60  # seconds
+_user_cache = TTLCache(maxsize=10_000, ttl=USER_CACHE_TTL)
+
+# AI chat
+EMERGENT_LLM_KEY = os.environ.get("EMERGENT_LLM_KEY")
+AI_THERAPIST_SYSTEM_MESSAGE = "You are a compassionate and professional AI therapist. Provide supportive, empathetic responses while maintaining appropriate boundaries. Help users explore their thoughts and feelings in a safe environment."
+
+# Indexes built at startup: (collection, keys, create_index options)
+INDEXES = [
+    ("users", "email", {"unique": True}),
+    ("users", "id", {"unique": True}),
+    ("therapists", "user_id", {"unique": True}),
+    ("therapists", "id", {"unique": True}),
+    ("therapist_availability", "therapist_id", {"unique": True}),
+    ("sessions", [("user_id", 1), ("session_type", 1)], {}),
+    ("sessions", "id", {"unique": True}),
+    ("chat_history", "session_id", {}),
+    ("payments", "user_id", {}),
+]
+
+# Pricing
+AI_SESSION_HOURLY_RATE = 5.0
+PLATFORM_FEE_RATE = 0.30  # platform keeps 30% of therapist sessions
+
+# Document ids are uuid4 strings cut from one batched urandom read
+ID_BATCH_SIZE = 1024
+_id_pool: List[str] = []
+
+# Most chat history messages returned per request
+CHAT_HISTORY_LIMIT = int(os.environ.get("CHAT_HISTORY_LIMIT", "1000"))
+
+# Chat messages are buffered and written in batches by a background task.
+# Each entry is (message_doc, future); the future resolves once the message
+# is stored, so callers still see write errors and read their own writes.
+CHAT_HISTORY_FLUSH_INTERVAL = 0.01  # seconds
+CHAT_HISTORY_QUEUE_SIZE = 1000  # producers wait when the writer falls behind
+CHAT_HISTORY_MAX_ATTEMPTS = 3
+CHAT_HISTORY_RETRY_DELAY = 0.1  # seconds, multiplied by the attempt number
+CHAT_HISTORY_WRITE_TIMEOUT = 10  # seconds ai_chat waits for its message to be stored
+DUPLICATE_KEY_ERROR = 11000
+_chat_history_queue: asyncio.Queue = asyncio.Queue(maxsize=CHAT_HISTORY_QUEUE_SIZE)
+_chat_history_task: Optional[asyncio.Task] = None
+
 # Create the main app without a prefix
-app = FastAPI(title="Thrapy API", description="AI and Licensed Therapist Platform")
+app = FastAPI(
+    title="Thrapy API",
+    description="AI and Licensed Therapist Platform",
+    default_response_class=ORJSONResponse
+)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -119,12 +196,49 @@ class PaymentRecord(BaseModel):
     therapist_earnings: Optional[float] = None
     created_at: datetime
 
+# Mongo projections matching the response models, so reads skip unused fields
+def _projection(model) -> Dict[str, int]:
+    return {**{field: 1 for field in model.model_fields}, "_id": 0}
+
+USER_PROJECTION = _projection(UserResponse)
+THERAPIST_PROJECTION = _projection(TherapistProfile)
+SESSION_PROJECTION = _projection(SessionResponse)
+PAYMENT_PROJECTION = _projection(PaymentRecord)
+
 # Utility Functions
-def hash_password(password: str) -> str:
-    return pwd_context.hash(password)
+def _bcrypt_hash(password: str) -> str:
+    return bcrypt.hashpw(password.encode(), bcrypt.gensalt(rounds=BCRYPT_ROUNDS)).decode()
 
-def verify_password(plain_password: str, hashed_password: str) -> bool:
-    return pwd_context.verify(plain_password, hashed_password)
+def _bcrypt_verify(plain_password: str, hashed_password: str) -> bool:
+    try:
+        return bcrypt.checkpw(plain_password.encode(), hashed_password.encode())
+    except ValueError:
+        # Malformed or unsupported hash
+        return False
+
+def password_needs_rehash(hashed_password: str) -> bool:
+    # Hashes look like "$2b$12$<salt+digest>"; rehash when the cost changed
+    try:
+        return int(hashed_password.split("$")[2]) != BCRYPT_ROUNDS
+    except (IndexError, ValueError):
+        return True
+
+async def hash_password(password: str) -> str:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_bcrypt_pool, _bcrypt_hash, password)
+
+async def verify_password(plain_password: str, hashed_password: str) -> bool:
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_bcrypt_pool, _bcrypt_verify, plain_password, hashed_password)
+
+def new_id() -> str:
+    if not _id_pool:
+        raw = os.urandom(16 * ID_BATCH_SIZE)
+        _id_pool.extend(
+            str(uuid.UUID(bytes=raw[i:i + 16], version=4))
+            for i in range(0, len(raw), 16)
+        )
+    return _id_pool.pop()
 
 def create_access_token(data: dict) -> str:
     to_encode = data.copy()
@@ -133,26 +247,143 @@ def create_access_token(data: dict) -> str:
     encoded_jwt = jwt.encode(to_encode, JWT_SECRET, algorithm=JWT_ALGORITHM)
     return encoded_jwt
 
-async def get_current_user(credentials: HTTPAuthorizationCredentials = Depends(security)):
+async def get_user_id(credentials: HTTPAuthorizationCredentials = Depends(security)) -> str:
+    # Token-only auth; routes should use get_current_user, which also checks
+    # that the account still exists
+    token = credentials.credentials
+    cached_claims = _token_cache.get(token)
+    if cached_claims is not None:
+        user_id, exp = cached_claims
+        if exp > time.time():
+            return user_id
+        _token_cache.pop(token, None)
+        raise HTTPException(status_code=401, detail="Invalid token")
+    
     try:
-        payload = jwt.decode(credentials.credentials, JWT_SECRET, algorithms=[JWT_ALGORITHM])
-        user_id: str = payload.get("sub")
-        if user_id is None:
-            raise HTTPException(status_code=401, detail="Invalid token")
-        
-        user = await db.users.find_one({"id": user_id})
-        if user is None:
-            raise HTTPException(status_code=401, detail="User not found")
-        
-        return UserResponse(**user)
+        payload = jwt.decode(token, JWT_SECRET, algorithms=[JWT_ALGORITHM])
     except jwt.PyJWTError:
         raise HTTPException(status_code=401, detail="Invalid token")
+    
+    user_id: str = payload.get("sub")
+    if user_id is None:
+        raise HTTPException(status_code=401, detail="Invalid token")
+    
+    # Only tokens carrying an expiry are safe to short-circuit later
+    if payload.get("exp") is not None:
+        _token_cache[token] = (user_id, payload["exp"])
+    return user_id
+
+async def get_user_record(user_id: str) -> UserResponse:
+    user = await db.users.find_one({"id": user_id}, USER_PROJECTION)
+    if user is None:
+        raise HTTPException(status_code=401, detail="User not found")
+    return UserResponse(**user)
+
+async def get_current_user(
+    credentials: HTTPAuthorizationCredentials = Depends(security),
+    user_id: str = Depends(get_user_id)
+):
+    cached_user = _user_cache.get(credentials.credentials)
+    if cached_user is not None:
+        return cached_user
+    
+    user_response = await get_user_record(user_id)
+    _user_cache[credentials.credentials] = user_response
+    return user_response
 
 async def get_admin_user(current_user: UserResponse = Depends(get_current_user)):
     if current_user.role != "admin":
         raise HTTPException(status_code=403, detail="Admin access required")
     return current_user
 
+@lru_cache(maxsize=1024)
+def _compute_cost(duration_minutes: int, hourly_rate: float) -> float:
+    return hourly_rate * (duration_minutes / 60)
+
+def _split_payment(cost: float) -> Tuple[float, float]:
+    # Earnings are the remainder of the charge after the fee, up to float rounding
+    platform_fee = cost * PLATFORM_FEE_RATE
+    return platform_fee, cost - platform_fee
+
+def _new_chat(session_id: str) -> LlmChat:
+    # LlmChat may hold per-conversation state, so each message gets its own
+    # instance; only the key and system prompt are shared
+    return LlmChat(
+        api_key=EMERGENT_LLM_KEY,
+        session_id=session_id,
+        system_message=AI_THERAPIST_SYSTEM_MESSAGE
+    ).with_model("openai", "gpt-4o-mini")
+
+async def _insert_chat_history(batch: List[tuple]):
+    pending = batch
+    error: Optional[Exception] = None
+    for attempt in range(CHAT_HISTORY_MAX_ATTEMPTS):
+        if attempt:
+            await asyncio.sleep(CHAT_HISTORY_RETRY_DELAY * attempt)
+        try:
+            await db.chat_history.insert_many([doc for doc, _ in pending], ordered=False)
+            pending = []
+            break
+        except BulkWriteError as e:
+            # insert_many assigns _id client-side, so a duplicate key means an
+            # earlier attempt already stored that document
+            failed = {
+                err["index"] for err in e.details.get("writeErrors", [])
+                if err.get("code") != DUPLICATE_KEY_ERROR
+            }
+            pending = [item for i, item in enumerate(pending) if i in failed]
+            error = e
+            if not pending:
+                break
+        except PyMongoError as e:
+            error = e
+        except Exception as e:
+            # Not a driver error (e.g. an unencodable document); retrying won't help
+            error = e
+            break
+    
+    if pending:
+        logger.error("Failed to write %d chat history messages: %s", len(pending), error)
+    failed_docs = {id(doc) for doc, _ in pending}
+    for doc, waiter in batch:
+        if waiter.done():
+            continue
+        if id(doc) in failed_docs:
+            waiter.set_exception(error)
+        else:
+            waiter.set_result(None)
+
+def _fail_chat_history_batch(batch: List[tuple], error: Exception):
+    for _, waiter in batch:
+        if not waiter.done():
+            waiter.set_exception(error)
+
+async def _chat_history_writer():
+    stopping = False
+    while not stopping:
+        batch = [await _chat_history_queue.get()]
+        while True:
+            try:
+                batch.append(_chat_history_queue.get_nowait())
+            except asyncio.QueueEmpty:
+                break
+        
+        # None is the shutdown sentinel; flush what we have and exit
+        if None in batch:
+            stopping = True
+            batch = [item for item in batch if item is not None]
+        
+        if batch:
+            try:
+                await _insert_chat_history(batch)
+            except Exception as e:
+                # Keep the writer alive; an unresolved future would hang its request
+                logger.exception("Chat history writer failed on a batch of %d", len(batch))
+                _fail_chat_history_batch(batch, e)
+        
+        if not stopping:
+            await asyncio.sleep(CHAT_HISTORY_FLUSH_INTERVAL)
+
 # Authentication Routes
 @api_router.post("/auth/register", response_model=TokenResponse)
 async def register(user: UserCreate):
@@ -162,8 +393,8 @@ async def register(user: UserCreate):
         raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create user
-    user_id = str(uuid.uuid4())
-    hashed_password = hash_password(user.password)
+    user_id = new_id()
+    hashed_password = await hash_password(user.password)
     
     user_doc = {
         "id": user_id,
@@ -174,7 +405,11 @@ async def register(user: UserCreate):
         "created_at": datetime.now(timezone.utc)
     }
     
-    await db.users.insert_one(user_doc)
+    try:
+        await db.users.insert_one(user_doc)
+    except DuplicateKeyError:
+        # Lost a race with another insert for the same email
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     # Create token
     access_token = create_access_token(data={"sub": user_id})
@@ -201,9 +436,9 @@ async def create_admin_account():
         raise HTTPException(status_code=400, detail="Admin account already exists")
     
     # Create admin user
-    admin_id = str(uuid.uuid4())
+    admin_id = new_id()
     admin_password = "admin123"  # Default password - should be changed
-    hashed_password = hash_password(admin_password)
+    hashed_password = await hash_password(admin_password)
     
     admin_doc = {
         "id": admin_id,
@@ -214,7 +449,11 @@ async def create_admin_account():
         "created_at": datetime.now(timezone.utc)
     }
     
-    await db.users.insert_one(admin_doc)
+    try:
+        await db.users.insert_one(admin_doc)
+    except DuplicateKeyError:
+        # Lost a race with another insert for the same email
+        raise HTTPException(status_code=400, detail="Email already registered")
     
     return {
         "message": "Admin account created successfully",
@@ -226,9 +465,17 @@ async def create_admin_account():
 @api_router.post("/auth/login", response_model=TokenResponse)
 async def login(user_login: UserLogin):
     user = await db.users.find_one({"email": user_login.email})
-    if not user or not verify_password(user_login.password, user["password_hash"]):
+    if not user or not await verify_password(user_login.password, user["password_hash"]):
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
+    # Upgrade hashes created with a different cost factor on successful login
+    if password_needs_rehash(user["password_hash"]):
+        new_hash = await hash_password(user_login.password)
+        await db.users.update_one(
+            {"id": user["id"]},
+            {"$set": {"password_hash": new_hash}}
+        )
+    
     access_token = create_access_token(data={"sub": user["id"]})
     
     user_response = UserResponse(
@@ -259,7 +506,7 @@ async def register_therapist(
     if existing_therapist:
         raise HTTPException(status_code=400, detail="Therapist profile already exists")
     
-    therapist_id = str(uuid.uuid4())
+    therapist_id = new_id()
     therapist_doc = {
         "id": therapist_id,
         "user_id": current_user.id,
@@ -278,8 +525,8 @@ async def register_therapist(
 
 @api_router.get("/therapists", response_model=List[TherapistProfile])
 async def get_therapists():
-    therapists = await db.therapists.find({"is_available": True}).to_list(100)
-    return [TherapistProfile(**therapist) for therapist in therapists]
+    therapists = await db.therapists.find({"is_available": True}, THERAPIST_PROJECTION).to_list(100)
+    return [TherapistProfile.model_construct(**therapist) for therapist in therapists]
 
 @api_router.post("/therapist/availability")
 async def set_availability(
@@ -292,7 +539,7 @@ async def set_availability(
     
     availability_doc = {
         "therapist_id": therapist["id"],
-        "availability": [slot.dict() for slot in availability.availability],
+        "availability": availability.model_dump(include={"availability"})["availability"],
         "updated_at": datetime.now(timezone.utc)
     }
     
@@ -310,15 +557,18 @@ async def create_session(
     session_data: SessionCreate,
     current_user: UserResponse = Depends(get_current_user)
 ):
-    session_id = str(uuid.uuid4())
+    session_id = new_id()
+    created_at = datetime.now(timezone.utc)
     
     # Admin users get free access to all services
     is_admin = current_user.role == "admin"
     
-    # Calculate cost based on session type
-    if session_data.session_type == "ai":
-        cost = 0.0 if is_admin else 5.0 * (session_data.duration_minutes / 60)  # $5 per hour, free for admin
-    elif session_data.session_type == "therapist":
+    # Reject unknown session types before touching the database
+    if session_data.session_type not in ("ai", "therapist"):
+        raise HTTPException(status_code=400, detail="Invalid session type")
+    
+    hourly_rate = AI_SESSION_HOURLY_RATE
+    if session_data.session_type == "therapist":
         if not session_data.therapist_id:
             raise HTTPException(status_code=400, detail="Therapist ID required for therapist sessions")
         
@@ -326,9 +576,9 @@ async def create_session(
         if not therapist:
             raise HTTPException(status_code=404, detail="Therapist not found")
         
-        cost = 0.0 if is_admin else therapist["hourly_rate"] * (session_data.duration_minutes / 60)
-    else:
-        raise HTTPException(status_code=400, detail="Invalid session type")
+        hourly_rate = therapist["hourly_rate"]
+    
+    cost = 0.0 if is_admin else _compute_cost(session_data.duration_minutes, hourly_rate)
     
     session_doc = {
         "id": session_id,
@@ -340,26 +590,27 @@ async def create_session(
         "cost": cost,
         "status": "scheduled",
         "is_admin_session": is_admin,
-        "created_at": datetime.now(timezone.utc)
+        "created_at": created_at
     }
     
+    # Write the session before charging for it: a payment must never exist for
+    # a session that failed to insert, so these two writes stay sequential
     await db.sessions.insert_one(session_doc)
     
     # Create payment record only if not admin
     if not is_admin and cost > 0:
         payment_doc = {
-            "id": str(uuid.uuid4()),
+            "id": new_id(),
             "user_id": current_user.id,
             "session_id": session_id,
             "amount": cost,
             "payment_type": f"{session_data.session_type}_session",
             "status": "completed",
-            "created_at": datetime.now(timezone.utc)
+            "created_at": created_at
         }
         
         if session_data.session_type == "therapist":
-            platform_fee = cost * 0.30  # 30% platform fee
-            therapist_earnings = cost * 0.70  # 70% to therapist
+            platform_fee, therapist_earnings = _split_payment(cost)
             payment_doc["platform_fee"] = platform_fee
             payment_doc["therapist_earnings"] = therapist_earnings
         
@@ -369,8 +620,8 @@ async def create_session(
 
 @api_router.get("/sessions", response_model=List[SessionResponse])
 async def get_user_sessions(current_user: UserResponse = Depends(get_current_user)):
-    sessions = await db.sessions.find({"user_id": current_user.id}).to_list(100)
-    return [SessionResponse(**session) for session in sessions]
+    sessions = await db.sessions.find({"user_id": current_user.id}, SESSION_PROJECTION).to_list(100)
+    return [SessionResponse.model_construct(**session) for session in sessions]
 
 # AI Chat Routes
 @api_router.post("/ai-chat", response_model=ChatResponse)
@@ -389,12 +640,7 @@ async def ai_chat(
         raise HTTPException(status_code=404, detail="AI session not found")
     
     try:
-        # Initialize AI chat
-        chat = LlmChat(
-            api_key=os.environ.get("EMERGENT_LLM_KEY"),
-            session_id=chat_message.session_id,
-            system_message="You are a compassionate and professional AI therapist. Provide supportive, empathetic responses while maintaining appropriate boundaries. Help users explore their thoughts and feelings in a safe environment."
-        ).with_model("openai", "gpt-4o-mini")
+        chat = _new_chat(chat_message.session_id)
         
         # Create user message
         user_message = UserMessage(text=chat_message.message)
@@ -404,7 +650,7 @@ async def ai_chat(
         
         # Store message history
         message_doc = {
-            "id": str(uuid.uuid4()),
+            "id": new_id(),
             "session_id": chat_message.session_id,
             "user_id": current_user.id,
             "user_message": chat_message.message,
@@ -412,7 +658,9 @@ async def ai_chat(
             "timestamp": datetime.now(timezone.utc)
         }
         
-        await db.chat_history.insert_one(message_doc)
+        stored = asyncio.get_running_loop().create_future()
+        await _chat_history_queue.put((message_doc, stored))
+        await asyncio.wait_for(stored, CHAT_HISTORY_WRITE_TIMEOUT)
         
         return ChatResponse(
             response=response,
@@ -436,20 +684,41 @@ async def get_chat_history(
     if not session:
         raise HTTPException(status_code=404, detail="Session not found")
     
-    history = await db.chat_history.find({"session_id": session_id}).to_list(1000)
-    return history
+    # Stream the history as a JSON array straight from the cursor instead of
+    # materializing every message first
+    cursor = db.chat_history.find({"session_id": session_id}, {"_id": 0}).limit(CHAT_HISTORY_LIMIT)
+    # Read the first message before responding so a failing query is a 500
+    first_message = await anext(cursor, None)
+    
+    async def stream_history():
+        yield b"["
+        message = first_message
+        separator = b""
+        try:
+            while message is not None:
+                yield separator + orjson.dumps(message, default=str)
+                separator = b","
+                message = await anext(cursor, None)
+        except Exception:
+            # The 200 and part of the body are already sent; abort the response
+            # instead of closing the array and hiding the truncation
+            logger.exception("Chat history stream failed for session %s", session_id)
+            raise
+        yield b"]"
+    
+    return StreamingResponse(stream_history(), media_type="application/json")
 
 # Payment Routes
 @api_router.get("/payments/history", response_model=List[PaymentRecord])
 async def get_payment_history(current_user: UserResponse = Depends(get_current_user)):
-    payments = await db.payments.find({"user_id": current_user.id}).to_list(100)
-    return [PaymentRecord(**payment) for payment in payments]
+    payments = await db.payments.find({"user_id": current_user.id}, PAYMENT_PROJECTION).to_list(100)
+    return [PaymentRecord.model_construct(**payment) for payment in payments]
 
 # Admin Routes
 @api_router.get("/admin/users", response_model=List[UserResponse])
 async def get_all_users(admin_user: UserResponse = Depends(get_admin_user)):
-    users = await db.users.find().to_list(1000)
-    return [UserResponse(**user) for user in users]
+    users = await db.users.find({}, USER_PROJECTION).to_list(1000)
+    return [UserResponse.model_construct(**user) for user in users]
 
 @api_router.get("/admin/sessions")
 async def get_all_sessions(admin_user: UserResponse = Depends(get_admin_user)):
@@ -466,6 +735,8 @@ async def delete_user(user_id: str, admin_user: UserResponse = Depends(get_admin
     result = await db.users.delete_one({"id": user_id})
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    # Local worker only; other workers expire the entry within USER_CACHE_TTL
+    _user_cache.clear()
     return {"message": "User deleted successfully"}
 
 @api_router.put("/admin/users/{user_id}/role")
@@ -480,6 +751,8 @@ async def update_user_role(user_id: str, new_role: str, admin_user: UserResponse
     
     if result.matched_count == 0:
         raise HTTPException(status_code=404, detail="User not found")
+    # Local worker only; other workers expire the entry within USER_CACHE_TTL
+    _user_cache.clear()
     
     return {"message": f"User role updated to {new_role}"}
 
@@ -540,12 +813,72 @@ app.add_middleware(
 )
 
 # Configure logging
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
-)
+class JSONLogFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "time": self.formatTime(record),
+            "name": record.name,
+            "level": record.levelname,
+            "message": record.getMessage()
+        }
+        if record.exc_text:
+            entry["exc_info"] = record.exc_text
+        if record.stack_info:
+            entry["stack_info"] = self.formatStack(record.stack_info)
+        return orjson.dumps(entry).decode()
+
+_traceback_formatter = logging.Formatter()
+
+class StructuredQueueHandler(QueueHandler):
+    # The stock prepare() merges the traceback into the message and drops
+    # exc_info; keep the message clean and carry the traceback in exc_text
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info and not record.exc_text:
+            record.exc_text = _traceback_formatter.formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+# Records are handed to a queue and written by a listener thread, so a slow
+# stream never blocks the event loop
+_log_queue = queue.SimpleQueue()
+_log_handler = logging.StreamHandler()
+_log_handler.setFormatter(JSONLogFormatter())
+_log_listener = QueueListener(_log_queue, _log_handler)
+_log_listener.start()
+
+root_logger = logging.getLogger()
+root_logger.setLevel(logging.INFO)
+root_logger.addHandler(StructuredQueueHandler(_log_queue))
 logger = logging.getLogger(__name__)
 
+@app.on_event("startup")
+async def warm_db_connection():
+    # Resolve DNS and complete the handshake before the first request arrives
+    await client.admin.command("ping")
+
+@app.on_event("startup")
+async def create_indexes():
+    # A failed index (e.g. duplicate emails in existing data) is logged rather
+    # than raised so the app still boots; dedupe and restart to build it
+    for collection, keys, options in INDEXES:
+        try:
+            await db[collection].create_index(keys, **options)
+        except PyMongoError:
+            logger.exception("Failed to create index %s on %s", keys, collection)
+
+@app.on_event("startup")
+async def start_chat_history_writer():
+    global _chat_history_task
+    _chat_history_task = asyncio.create_task(_chat_history_writer())
+
 @app.on_event("shutdown")
 async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+    if _chat_history_task is not None:
+        await _chat_history_queue.put(None)
+        await _chat_history_task
+    client.close()
+    _bcrypt_pool.shutdown(wait=False)
+    _log_listener.stop()
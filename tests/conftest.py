@@ -0,0 +1,9 @@
+import os
+import sys
+from pathlib import Path
+
+# server.py reads its Mongo settings at import time; creating the Motor client
+# does not connect, so placeholders are enough for unit tests
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "thrapy_test")
+sys.path.insert(0, str(Path(__file__).resolve().parents[1] / "backend"))
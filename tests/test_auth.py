@@ -0,0 +1,164 @@
+import asyncio
+import time
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import jwt
+import pytest
+from fastapi import HTTPException
+from fastapi.security import HTTPAuthorizationCredentials
+
+import server
+
+
+def bearer(token: str) -> HTTPAuthorizationCredentials:
+    return HTTPAuthorizationCredentials(scheme="Bearer", credentials=token)
+
+
+# Password hashing
+def test_password_needs_rehash_matches_configured_cost(monkeypatch):
+    monkeypatch.setattr(server, "BCRYPT_ROUNDS", 4)
+    hashed = server._bcrypt_hash("secret")
+
+    assert server._bcrypt_verify("secret", hashed)
+    assert not server.password_needs_rehash(hashed)
+
+    monkeypatch.setattr(server, "BCRYPT_ROUNDS", 5)
+    assert server.password_needs_rehash(hashed)
+
+
+def test_password_needs_rehash_for_malformed_hash():
+    assert server.password_needs_rehash("not-a-bcrypt-hash")
+    assert not server._bcrypt_verify("secret", "not-a-bcrypt-hash")
+
+
+# User cache
+class FakeUsers:
+    def __init__(self, *docs):
+        self.docs = {doc["id"]: doc for doc in docs}
+        self.find_one_calls = 0
+
+    async def find_one(self, query, projection=None):
+        self.find_one_calls += 1
+        return self.docs.get(query["id"])
+
+    async def delete_one(self, query):
+        deleted = self.docs.pop(query["id"], None)
+        return SimpleNamespace(deleted_count=int(deleted is not None))
+
+    async def update_one(self, query, update):
+        doc = self.docs.get(query["id"])
+        if doc is not None:
+            doc.update(update["$set"])
+        return SimpleNamespace(matched_count=int(doc is not None))
+
+
+def make_user(user_id="user-1", role="client"):
+    return {
+        "id": user_id,
+        "email": f"{user_id}@thrapy.com",
+        "full_name": "Test User",
+        "role": role,
+        "created_at": datetime.now(timezone.utc)
+    }
+
+
+@pytest.fixture
+def users(monkeypatch):
+    fake_users = FakeUsers(make_user())
+    monkeypatch.setattr(server, "db", SimpleNamespace(users=fake_users))
+    server._user_cache.clear()
+    yield fake_users
+    server._user_cache.clear()
+
+
+def test_get_current_user_caches_per_token(users):
+    credentials = bearer("token-1")
+
+    first = asyncio.run(server.get_current_user(credentials, "user-1"))
+    second = asyncio.run(server.get_current_user(credentials, "user-1"))
+
+    assert first.id == "user-1"
+    assert second is first
+    assert users.find_one_calls == 1
+
+
+def test_get_current_user_rejects_missing_user(users):
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(server.get_current_user(bearer("token-2"), "missing"))
+    assert exc_info.value.status_code == 401
+    assert "token-2" not in server._user_cache
+
+
+def test_delete_user_clears_user_cache(users):
+    asyncio.run(server.get_current_user(bearer("token-1"), "user-1"))
+    admin = server.UserResponse(**make_user("admin-1", role="admin"))
+
+    asyncio.run(server.delete_user("user-1", admin))
+
+    assert len(server._user_cache) == 0
+    with pytest.raises(HTTPException):
+        asyncio.run(server.get_current_user(bearer("token-1"), "user-1"))
+
+
+def test_update_user_role_clears_user_cache(users):
+    asyncio.run(server.get_current_user(bearer("token-1"), "user-1"))
+    admin = server.UserResponse(**make_user("admin-1", role="admin"))
+
+    asyncio.run(server.update_user_role("user-1", "therapist", admin))
+
+    assert len(server._user_cache) == 0
+    refreshed = asyncio.run(server.get_current_user(bearer("token-1"), "user-1"))
+    assert refreshed.role == "therapist"
+
+
+# Token claims cache
+@pytest.fixture
+def token_cache():
+    server._token_cache.clear()
+    yield server._token_cache
+    server._token_cache.clear()
+
+
+def test_get_user_id_decodes_and_caches_claims(token_cache):
+    token = server.create_access_token({"sub": "user-1"})
+
+    assert asyncio.run(server.get_user_id(bearer(token))) == "user-1"
+    user_id, exp = token_cache[token]
+    assert user_id == "user-1"
+    assert exp > time.time()
+
+
+def test_get_user_id_cache_hit_skips_decode(token_cache, monkeypatch):
+    token = server.create_access_token({"sub": "user-1"})
+    asyncio.run(server.get_user_id(bearer(token)))
+
+    def fail_decode(*args, **kwargs):
+        raise AssertionError("cached token should not be decoded again")
+
+    monkeypatch.setattr(server.jwt, "decode", fail_decode)
+    assert asyncio.run(server.get_user_id(bearer(token))) == "user-1"
+
+
+def test_get_user_id_evicts_expired_cached_claims(token_cache):
+    token = server.create_access_token({"sub": "user-1"})
+    token_cache[token] = ("user-1", time.time() - 1)
+
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(server.get_user_id(bearer(token)))
+    assert exc_info.value.status_code == 401
+    assert token not in token_cache
+
+
+def test_get_user_id_rejects_invalid_token(token_cache):
+    with pytest.raises(HTTPException) as exc_info:
+        asyncio.run(server.get_user_id(bearer("not-a-token")))
+    assert exc_info.value.status_code == 401
+    assert "not-a-token" not in token_cache
+
+
+def test_get_user_id_does_not_cache_tokens_without_expiry(token_cache):
+    token = jwt.encode({"sub": "user-2"}, server.JWT_SECRET, algorithm=server.JWT_ALGORITHM)
+
+    assert asyncio.run(server.get_user_id(bearer(token))) == "user-2"
+    assert token not in token_cache
@@ -0,0 +1,271 @@
+import asyncio
+import json
+from datetime import datetime, timezone
+from types import SimpleNamespace
+
+import pytest
+from bson.errors import InvalidDocument
+from fastapi import HTTPException
+from pymongo.errors import AutoReconnect, BulkWriteError
+
+import server
+
+
+def make_user(user_id="user-1"):
+    return server.UserResponse(
+        id=user_id,
+        email=f"{user_id}@thrapy.com",
+        full_name="Test User",
+        created_at=datetime.now(timezone.utc)
+    )
+
+
+# History streaming
+class FakeCursor:
+    def __init__(self, docs, projection, fail_after=None):
+        # Apply exclusions like Mongo does, so the test sees what the route asked for
+        excluded = [field for field, value in projection.items() if not value]
+        self.docs = [{k: v for k, v in doc.items() if k not in excluded} for doc in docs]
+        self.fail_after = fail_after
+        self.limit_value = None
+
+    def limit(self, value):
+        self.limit_value = value
+        self.docs = self.docs[:value]
+        return self
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        if self.fail_after is not None and self.fail_after == 0:
+            raise RuntimeError("cursor died")
+        if not self.docs:
+            raise StopAsyncIteration
+        if self.fail_after is not None:
+            self.fail_after -= 1
+        return self.docs.pop(0)
+
+
+class FakeChatHistory:
+    def __init__(self, docs, fail_after=None):
+        self.docs = docs
+        self.fail_after = fail_after
+        self.cursor = None
+
+    def find(self, query, projection):
+        docs = [doc for doc in self.docs if doc["session_id"] == query["session_id"]]
+        self.cursor = FakeCursor(docs, projection, self.fail_after)
+        return self.cursor
+
+
+class FakeSessions:
+    async def find_one(self, query):
+        if query["id"] == "session-1" and query["user_id"] == "user-1":
+            return {"id": "session-1", "user_id": "user-1"}
+        return None
+
+
+def make_message(index):
+    return {
+        "_id": object(),
+        "id": f"message-{index}",
+        "session_id": "session-1",
+        "user_message": f"hello {index}",
+        "ai_response": "hi",
+        "timestamp": datetime(2024, 1, 1, tzinfo=timezone.utc)
+    }
+
+
+def use_history(monkeypatch, docs, fail_after=None):
+    chat_history = FakeChatHistory(docs, fail_after)
+    monkeypatch.setattr(server, "db", SimpleNamespace(sessions=FakeSessions(), chat_history=chat_history))
+    return chat_history
+
+
+def fetch_history(session_id="session-1"):
+    async def run():
+        response = await server.get_chat_history(session_id, make_user())
+        return b"".join([chunk async for chunk in response.body_iterator])
+
+    return asyncio.run(run())
+
+
+def test_chat_history_streams_json_array_without_object_ids(monkeypatch):
+    use_history(monkeypatch, [make_message(i) for i in range(3)])
+
+    history = json.loads(fetch_history())
+
+    assert [message["id"] for message in history] == ["message-0", "message-1", "message-2"]
+    assert all("_id" not in message for message in history)
+    assert history[0]["timestamp"] == "2024-01-01T00:00:00+00:00"
+
+
+def test_chat_history_empty_session_is_empty_array(monkeypatch):
+    use_history(monkeypatch, [])
+
+    assert json.loads(fetch_history()) == []
+
+
+def test_chat_history_is_capped(monkeypatch):
+    monkeypatch.setattr(server, "CHAT_HISTORY_LIMIT", 2)
+    chat_history = use_history(monkeypatch, [make_message(i) for i in range(5)])
+
+    assert len(json.loads(fetch_history())) == 2
+    assert chat_history.cursor.limit_value == 2
+
+
+def test_chat_history_cursor_error_aborts_stream(monkeypatch, caplog):
+    use_history(monkeypatch, [make_message(i) for i in range(3)], fail_after=1)
+
+    with pytest.raises(RuntimeError):
+        fetch_history()
+    assert "Chat history stream failed" in caplog.text
+
+
+def test_chat_history_unknown_session_is_404(monkeypatch):
+    use_history(monkeypatch, [])
+
+    with pytest.raises(HTTPException) as exc_info:
+        fetch_history("session-2")
+    assert exc_info.value.status_code == 404
+
+
+# Batched history writes
+class ScriptedChatHistory:
+    def __init__(self, *outcomes):
+        # One outcome per insert_many call: None succeeds, an exception is raised
+        self.outcomes = list(outcomes)
+        self.calls = []
+
+    async def insert_many(self, docs, ordered):
+        self.calls.append([doc["id"] for doc in docs])
+        outcome = self.outcomes.pop(0) if self.outcomes else None
+        if outcome is not None:
+            raise outcome
+
+
+def bulk_error(*failures):
+    return BulkWriteError({
+        "writeErrors": [{"index": index, "code": code, "errmsg": "failed"} for index, code in failures]
+    })
+
+
+@pytest.fixture
+def chat_history(monkeypatch):
+    def install(*outcomes):
+        fake = ScriptedChatHistory(*outcomes)
+        monkeypatch.setattr(server, "db", SimpleNamespace(chat_history=fake))
+        return fake
+
+    monkeypatch.setattr(server, "CHAT_HISTORY_RETRY_DELAY", 0)
+    monkeypatch.setattr(server, "_chat_history_queue", asyncio.Queue())
+    return install
+
+
+def insert_batch(count):
+    async def run():
+        loop = asyncio.get_running_loop()
+        batch = [(make_message(i), loop.create_future()) for i in range(count)]
+        await server._insert_chat_history(batch)
+        return [waiter for _, waiter in batch]
+
+    return asyncio.run(run())
+
+
+def test_insert_chat_history_resolves_batch(chat_history):
+    fake = chat_history()
+
+    waiters = insert_batch(3)
+
+    assert fake.calls == [["message-0", "message-1", "message-2"]]
+    assert all(waiter.result() is None for waiter in waiters)
+
+
+def test_insert_chat_history_retries_only_failed_documents(chat_history):
+    fake = chat_history(bulk_error((1, 121)))
+
+    waiters = insert_batch(3)
+
+    assert fake.calls == [["message-0", "message-1", "message-2"], ["message-1"]]
+    assert all(waiter.result() is None for waiter in waiters)
+
+
+def test_insert_chat_history_counts_duplicate_keys_as_stored(chat_history):
+    fake = chat_history(
+        AutoReconnect("connection reset"),
+        bulk_error((0, server.DUPLICATE_KEY_ERROR), (1, server.DUPLICATE_KEY_ERROR))
+    )
+
+    waiters = insert_batch(2)
+
+    assert len(fake.calls) == 2
+    assert all(waiter.result() is None for waiter in waiters)
+
+
+def test_insert_chat_history_fails_waiters_when_retries_run_out(chat_history):
+    fake = chat_history(*[AutoReconnect("down")] * server.CHAT_HISTORY_MAX_ATTEMPTS)
+
+    waiters = insert_batch(2)
+
+    assert len(fake.calls) == server.CHAT_HISTORY_MAX_ATTEMPTS
+    assert all(isinstance(waiter.exception(), AutoReconnect) for waiter in waiters)
+
+
+def test_insert_chat_history_does_not_retry_non_driver_errors(chat_history):
+    fake = chat_history(InvalidDocument("cannot encode object"))
+
+    waiters = insert_batch(2)
+
+    assert len(fake.calls) == 1
+    assert all(isinstance(waiter.exception(), InvalidDocument) for waiter in waiters)
+
+
+def test_writer_survives_a_failing_batch(chat_history, monkeypatch):
+    chat_history()
+    insert = server._insert_chat_history
+    calls = []
+
+    async def flaky_insert(batch):
+        calls.append(len(batch))
+        if len(calls) == 1:
+            raise RuntimeError("writer bug")
+        await insert(batch)
+
+    monkeypatch.setattr(server, "_insert_chat_history", flaky_insert)
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        writer = asyncio.create_task(server._chat_history_writer())
+        first = loop.create_future()
+        await server._chat_history_queue.put((make_message(0), first))
+        with pytest.raises(RuntimeError):
+            await asyncio.wait_for(first, 1)
+
+        second = loop.create_future()
+        await server._chat_history_queue.put((make_message(1), second))
+        await asyncio.wait_for(second, 1)
+
+        await server._chat_history_queue.put(None)
+        await asyncio.wait_for(writer, 1)
+
+    asyncio.run(run())
+    assert calls == [1, 1]
+
+
+def test_writer_flushes_queue_on_shutdown_sentinel(chat_history):
+    fake = chat_history()
+
+    async def run():
+        loop = asyncio.get_running_loop()
+        waiters = [loop.create_future() for _ in range(3)]
+        for index, waiter in enumerate(waiters):
+            await server._chat_history_queue.put((make_message(index), waiter))
+        await server._chat_history_queue.put(None)
+
+        await asyncio.wait_for(server._chat_history_writer(), 1)
+        return waiters
+
+    waiters = asyncio.run(run())
+    assert fake.calls == [["message-0", "message-1", "message-2"]]
+    assert all(waiter.result() is None for waiter in waiters)
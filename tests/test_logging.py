@@ -0,0 +1,49 @@
+import json
+import logging
+import queue
+
+import server
+
+
+def emit_through_queue(log):
+    records = queue.SimpleQueue()
+    logger = logging.getLogger("tests.structured")
+    logger.propagate = False
+    handler = server.StructuredQueueHandler(records)
+    logger.addHandler(handler)
+    try:
+        log(logger)
+    finally:
+        logger.removeHandler(handler)
+    return json.loads(server.JSONLogFormatter().format(records.get_nowait()))
+
+
+def test_structured_queue_handler_keeps_traceback_out_of_message():
+    def log(logger):
+        try:
+            1 / 0
+        except ZeroDivisionError:
+            logger.exception("failed %d times", 3)
+
+    entry = emit_through_queue(log)
+
+    assert entry["message"] == "failed 3 times"
+    assert entry["level"] == "ERROR"
+    assert "ZeroDivisionError" in entry["exc_info"]
+
+
+def test_json_log_formatter_emits_stack_info():
+    entry = emit_through_queue(lambda logger: logger.warning("look here", stack_info=True))
+
+    assert entry["message"] == "look here"
+    assert entry["stack_info"].startswith("Stack (most recent call last):")
+    assert "exc_info" not in entry
+
+
+def test_json_log_formatter_plain_record():
+    entry = emit_through_queue(lambda logger: logger.warning("hello"))
+
+    assert entry["message"] == "hello"
+    assert entry["name"] == "tests.structured"
+    assert "exc_info" not in entry
+    assert "stack_info" not in entry
@@ -0,0 +1,31 @@
+import uuid
+
+import pytest
+
+import server
+
+
+# Document ids
+def test_new_id_returns_uuid4_strings():
+    ids = [server.new_id() for _ in range(server.ID_BATCH_SIZE * 2 + 1)]
+
+    for value in ids:
+        parsed = uuid.UUID(value)
+        assert parsed.version == 4
+        assert str(parsed) == value
+    assert len(set(ids)) == len(ids)
+
+
+# Pricing
+def test_compute_cost_scales_hourly_rate_by_duration():
+    assert server._compute_cost(60, server.AI_SESSION_HOURLY_RATE) == 5.0
+    assert server._compute_cost(90, 100.0) == 150.0
+    assert server._compute_cost(30, 80.0) == 40.0
+
+
+def test_split_payment_fee_and_earnings_add_up_to_cost():
+    platform_fee, therapist_earnings = server._split_payment(150.0)
+
+    assert platform_fee == pytest.approx(45.0)
+    assert therapist_earnings == pytest.approx(105.0)
+    assert platform_fee + therapist_earnings == pytest.approx(150.0)